@@ -15,6 +15,7 @@ from app.custom_models.extract import ExtractRequest, ExtractResponse
 from app.utilities.upload import get_file_content, allowed_file, read_file
 from app.utilities.ocr import store_embeddings
 from app.utilities.extract import query, generate_response
+from app.utilities.admission import ADMISSION, INGESTION, INTERACTIVE
 from app.logger.custom_logger import log
 
 load_dotenv()
@@ -77,19 +78,25 @@ async def file_upload(files: list[UploadFile]) -> list[FileUploadResponse] | dic
     return res
 
 @app.post("/ocr")
-async def mock_ocr(file: OcrRequest) -> OcrResponse | dict:
+async def mock_ocr(file: OcrRequest, response: Response) -> OcrResponse | dict:
     """
     Simulates running an OCR service on a file for a given a signed url.
     Process OCR results with OpenAI's embedding models, 
     then upload the embeddings to a vector database
     """
+    async with ADMISSION.admit(INGESTION) as queue_wait:
+        set_queue_wait(response, queue_wait)
+        return await run_ocr(file)
+
+async def run_ocr(file: OcrRequest) -> OcrResponse | dict:
+    """ocr task once the request is admitted"""
     try:
         mock_files = os.getenv('MOCK_OCR_FILES').split(',')
         data = None
         if file.filename in mock_files:
             json_file = file.filename.rsplit(".", 1)[0] + '.json'
-            # performance bottleneck
-            data = read_file(json_file)
+            # parse large ocr result in the worker threads of the ingestion pool
+            data = await ADMISSION.run(INGESTION, read_file, json_file)
         else:
             data = await get_file_content(file.file_url, file.filename.lower().split('.')[-1])
             # files that are not in mock_files should stop doing embeddings
@@ -108,22 +115,34 @@ async def mock_ocr(file: OcrRequest) -> OcrResponse | dict:
         raise HTTPException(status_code=500, detail={"message": str(e)}) from e
 
 @app.post("/extract")
-async def text_query(req_body: ExtractRequest) -> ExtractResponse | dict:
+async def text_query(req_body: ExtractRequest, response: Response) -> ExtractResponse | dict:
     """
     high level support for doing this and that.
     """
+    async with ADMISSION.admit(INTERACTIVE) as queue_wait:
+        set_queue_wait(response, queue_wait)
+        return await run_extract(req_body)
+
+async def run_extract(req_body: ExtractRequest) -> ExtractResponse | dict:
+    """extract task once the request is admitted"""
     query_text = req_body.query_text
     doc_id = req_body.file_id
     try:
         # query vector db
-        prompt = query(pc_client, openai_client, query_text, doc_id)
+        prompt = await query(pc_client, openai_client, query_text, doc_id)
         if not prompt:
             raise ValueError("Not Found Relvant Context")
         # answer question with given prompt
-        answer = generate_response(openai_client, prompt)
+        answer = await generate_response(openai_client, prompt)
         if not answer:
             raise ValueError("No Available Answer From LLM Model")
         return ExtractResponse(message="query finished", query_answer=answer)
     except Exception as e:
         log.error(str(e))
         raise HTTPException(status_code=500, detail={"message": str(e)}) from e
+
+def set_queue_wait(response: Response, queue_wait: float) -> None:
+    """report admission queue wait time in response header and logger"""
+    queue_wait_ms = round(queue_wait * 1000)
+    response.headers["X-Queue-Wait-Ms"] = str(queue_wait_ms)
+    log.info(f"Admission queue wait: {queue_wait_ms} ms")
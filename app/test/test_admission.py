@@ -0,0 +1,115 @@
+"""unit test cases for admission control"""
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from app.utilities.admission import AdmissionController, INGESTION, INTERACTIVE
+
+def test_admission_reports_queue_wait():
+    """
+    Admitted request without contention yields its queue wait.
+    """
+    controller = AdmissionController()
+
+    async def run():
+        async with controller.admit(INTERACTIVE) as queue_wait:
+            return queue_wait
+
+    assert asyncio.run(run()) >= 0
+
+def test_admission_queue_full(monkeypatch):
+    """
+    Request is shed with 429 and Retry-After once the queue is full.
+    """
+    monkeypatch.setenv("ADMISSION_OCR_MAX_CONCURRENCY", "1")
+    monkeypatch.setenv("ADMISSION_OCR_MAX_QUEUE", "0")
+    monkeypatch.setenv("ADMISSION_RETRY_AFTER_SECONDS", "7")
+    controller = AdmissionController()
+
+    async def run():
+        async with controller.admit(INGESTION):
+            async with controller.admit(INGESTION):
+                pass
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(run())
+    assert e.value.status_code == 429
+    assert e.value.headers == {"Retry-After": "7"}
+
+def test_admission_wait_timeout(monkeypatch):
+    """
+    Request is shed with 503 once it waited longer than the maximum wait.
+    """
+    monkeypatch.setenv("ADMISSION_EXTRACT_MAX_CONCURRENCY", "1")
+    monkeypatch.setenv("ADMISSION_EXTRACT_MAX_WAIT_SECONDS", "0.01")
+    controller = AdmissionController()
+
+    async def run():
+        async with controller.admit(INTERACTIVE):
+            async with controller.admit(INTERACTIVE):
+                pass
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(run())
+    assert e.value.status_code == 503
+
+def test_admission_interactive_priority(monkeypatch):
+    """
+    Queued interactive requests are admitted before queued ingestion requests.
+    """
+    monkeypatch.setenv("ADMISSION_EXTRACT_MAX_CONCURRENCY", "1")
+    controller = AdmissionController()
+    order = []
+
+    async def request(name):
+        async with controller.admit(name):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with controller.admit(INTERACTIVE):
+            tasks = [asyncio.create_task(request(INTERACTIVE))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request(INGESTION)))
+            await asyncio.sleep(0)
+            # ingestion has a free slot but waits behind the queued query
+            assert not order
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [INTERACTIVE, INGESTION]
+
+def test_admission_queue_is_fifo(monkeypatch):
+    """
+    Queued request gets the freed slot before a later arrival.
+    """
+    monkeypatch.setenv("ADMISSION_EXTRACT_MAX_CONCURRENCY", "1")
+    controller = AdmissionController()
+    order = []
+
+    async def request(label):
+        async with controller.admit(INTERACTIVE):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with controller.admit(INTERACTIVE):
+            queued = asyncio.create_task(request("queued"))
+            await asyncio.sleep(0)
+        # slot was handed to the queued request, the newcomer has to wait behind it
+        await request("newcomer")
+        await queued
+
+    asyncio.run(run())
+    assert order == ["queued", "newcomer"]
+
+def test_admission_run_uses_pool_threads(monkeypatch):
+    """
+    Blocking calls run in the worker threads of their endpoint class.
+    """
+    monkeypatch.setenv("ADMISSION_OCR_MAX_CONCURRENCY", "2")
+    controller = AdmissionController()
+
+    thread_name = asyncio.run(controller.run(INGESTION, lambda: threading.current_thread().name))
+    assert thread_name.startswith("admission-ocr")
+    assert controller.pool(INGESTION).executor._max_workers == 2 # pylint: disable=protected-access
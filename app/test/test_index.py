@@ -0,0 +1,94 @@
+"""unit test cases for vector index registry"""
+import asyncio
+import pytest
+from pinecone import PineconeException
+from app.utilities.index import IndexRegistry
+
+def mock_pinecone(mocker, names):
+    """create a pinecone client mock holding the given index names"""
+    pc = mocker.MagicMock()
+    pc.list_indexes.return_value.names.return_value = names
+    pc.describe_index.return_value.status = {'ready': True}
+    return pc
+
+def test_index_handle_is_cached(mocker):
+    """
+    Existence and readiness are only checked on the first lookup.
+    """
+    pc = mock_pinecone(mocker, ["test-index"])
+    registry = IndexRegistry()
+
+    first = asyncio.run(registry.get_index(pc, "test-index"))
+    second = asyncio.run(registry.get_index(pc, "test-index"))
+    assert first is second
+    assert pc.list_indexes.call_count == 1
+    assert pc.describe_index.call_count == 1
+    pc.create_index.assert_not_called()
+
+def test_index_handle_invalidate(mocker):
+    """
+    Invalidated handles are checked again on the next lookup.
+    """
+    pc = mock_pinecone(mocker, ["test-index"])
+    registry = IndexRegistry()
+
+    asyncio.run(registry.get_index(pc, "test-index"))
+    registry.invalidate("test-index")
+    asyncio.run(registry.get_index(pc, "test-index"))
+    assert pc.list_indexes.call_count == 2
+
+def test_index_handle_refresh_interval(mocker, monkeypatch):
+    """
+    Handles older than the refresh interval are checked again.
+    """
+    monkeypatch.setenv("PINECONE_INDEX_REFRESH_SECONDS", "-1") # always expired
+    pc = mock_pinecone(mocker, ["test-index"])
+    registry = IndexRegistry()
+
+    asyncio.run(registry.get_index(pc, "test-index"))
+    asyncio.run(registry.get_index(pc, "test-index"))
+    assert pc.list_indexes.call_count == 2
+
+def test_index_create_when_missing(mocker):
+    """
+    Missing index is created only when requested.
+    """
+    pc = mock_pinecone(mocker, [])
+    registry = IndexRegistry()
+
+    with pytest.raises(ValueError):
+        asyncio.run(registry.get_index(pc, "test-index"))
+    pc.create_index.assert_not_called()
+
+    asyncio.run(registry.get_index(pc, "test-index", create=True))
+    pc.create_index.assert_called_once()
+
+def test_index_invalidate_on_error(mocker):
+    """
+    Pinecone error drops the cached handle and is re-raised.
+    """
+    pc = mock_pinecone(mocker, ["test-index"])
+    registry = IndexRegistry()
+
+    asyncio.run(registry.get_index(pc, "test-index"))
+    with pytest.raises(PineconeException):
+        with registry.invalidate_on_error("test-index"):
+            raise PineconeException("index is gone")
+    asyncio.run(registry.get_index(pc, "test-index"))
+    assert pc.list_indexes.call_count == 2
+
+def test_index_not_ready(mocker, monkeypatch):
+    """
+    Index that never becomes ready fails instead of waiting forever.
+    """
+    monkeypatch.setenv("PINECONE_INDEX_READY_TIMEOUT_SECONDS", "0")
+    pc = mock_pinecone(mocker, ["test-index"])
+    pc.describe_index.return_value.status = {'ready': False}
+    registry = IndexRegistry()
+
+    with pytest.raises(ValueError):
+        asyncio.run(registry.get_index(pc, "test-index"))
+    assert pc.describe_index.call_count == 1
+    with pytest.raises(ValueError):
+        asyncio.run(registry.get_index(pc, "test-index", create=True))
+    pc.Index.assert_not_called()
@@ -0,0 +1,73 @@
+"""unit test cases for lexical re-ranking"""
+from app.utilities.lexical import LexicalIndex, char_ngrams
+from app.utilities.extract import ENCODER, rerank, build_prompt
+
+def test_char_ngrams_normalized():
+    """
+    Whitespace is dropped and full-width characters are folded.
+    """
+    assert char_ngrams("建築\n基準 ＡＢ") == ["建築", "築基", "基準", "準a", "ab"]
+    assert char_ngrams("法") == ["法"]
+    assert not char_ngrams(" ")
+
+def test_lexical_index_score():
+    """
+    Chunk sharing more query n-grams scores higher, re-adding replaces old text.
+    """
+    index = LexicalIndex()
+    index.add("doc0#chunk0", "学校の教室には非常用の照明装置を設ける")
+    index.add("doc0#chunk1", "共同住宅の各戸の界壁は遮音上有効な構造とする")
+    scores = index.score("学校の照明", ["doc0#chunk0", "doc0#chunk1"])
+    assert scores["doc0#chunk0"] > scores["doc0#chunk1"] == 0
+
+    index.add("doc0#chunk0", "共同住宅")
+    assert len(index) == 2
+    assert index.score("学校の照明", ["doc0#chunk0"]) == {"doc0#chunk0": 0.0}
+
+def test_rerank_fuses_lexical_score(monkeypatch):
+    """
+    Lexical match moves a slightly less similar chunk to the front.
+    """
+    monkeypatch.setenv("LEXICAL_WEIGHT", "0.3")
+    # keep test chunks out of the process-wide index
+    monkeypatch.setattr("app.utilities.extract.LEXICAL_INDEX", LexicalIndex())
+    matches = [
+        {"id": "test0#chunk0", "score": 0.52, "metadata": {"text": "共同住宅の界壁は遮音構造とする"}},
+        {"id": "test0#chunk1", "score": 0.51, "metadata": {"text": "学校の教室に照明装置を設ける"}},
+        {"id": "test0#chunk2", "score": 0.40, "metadata": {"text": "敷地は道路に接しなければならない"}},
+    ]
+    assert rerank(matches, "学校の照明装置") == ["学校の教室に照明装置を設ける",
+                                            "共同住宅の界壁は遮音構造とする",
+                                            "敷地は道路に接しなければならない"]
+    assert not rerank([], "学校")
+
+def test_rerank_keeps_better_vector_match(monkeypatch):
+    """
+    Clearly better vector match stays ahead of a weak lexical hit.
+    """
+    monkeypatch.setenv("LEXICAL_WEIGHT", "0.3")
+    monkeypatch.setattr("app.utilities.extract.LEXICAL_INDEX", LexicalIndex())
+    matches = [
+        {"id": "test0#chunk0", "score": 0.60, "metadata": {"text": "小学校の教室は四階以上に設けない"}},
+        {"id": "test0#chunk1", "score": 0.40, "metadata": {"text": "照明の明るさを確保する"}},
+        {"id": "test0#chunk2", "score": 0.35, "metadata": {"text": "敷地は道路に接しなければならない"}},
+    ]
+    assert rerank(matches, "学校の照明装置")[0] == "小学校の教室は四階以上に設けない"
+
+def test_build_prompt_context_budget(monkeypatch):
+    """
+    Prompt keeps the best re-ranked matches within the context budget.
+    """
+    best_text = "学校の照明装置 " * 10
+    # budget fits the best match exactly
+    monkeypatch.setenv("OPENAI_GPT_MODEL_MAX_TOKEN", "128000")
+    monkeypatch.setenv("PROMPT_CONTEXT_MAX_TOKEN", str(len(ENCODER.encode(best_text))))
+    monkeypatch.setattr("app.utilities.extract.LEXICAL_INDEX", LexicalIndex())
+    matches = [
+        {"id": "test0#chunk0", "score": 0.52, "metadata": {"text": "共同住宅の界壁 " * 10}},
+        {"id": "test0#chunk1", "score": 0.51, "metadata": {"text": best_text}},
+        {"id": "test0#chunk2", "score": 0.40, "metadata": {"text": "敷地の接道 " * 10}},
+    ]
+    prompt = build_prompt(matches, "学校の照明装置")
+    assert "学校の照明装置" in prompt.split("Question:")[0]
+    assert "共同住宅" not in prompt
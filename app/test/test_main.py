@@ -1,4 +1,7 @@
 """unit test cases for three endpoints"""
+import asyncio
+import threading
+import httpx
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -285,3 +288,33 @@ def test_extract_valid_body_success(mocker):
     response = client.post("/extract", json=body)
     assert response.status_code == 200
     assert response.json() == {'message': 'query finished', 'query_answer': 'this is answer'}
+    assert "x-queue-wait-ms" in response.headers
+
+def test_extract_concurrent_requests(mocker):
+    """
+    Admitted extract requests run concurrently instead of blocking the event loop
+    """
+    body = {
+        "query_text": "How are you?",
+        "file_id": "doc0"
+        }
+    # both completions must be in flight at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    completion = mocker.MagicMock()
+    completion.choices[0].message.content = "this is answer"
+
+    def create(**_):
+        barrier.wait()
+        return completion
+
+    mocker.patch("app.main.query", return_value="this is query text")
+    mocker.patch("app.main.openai_client.chat.completions.create", side_effect=create)
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), \
+                                     base_url="http://test") as async_client:
+            return await asyncio.gather(*[async_client.post("/extract", json=body) \
+                                          for _ in range(2)])
+
+    responses = asyncio.run(send())
+    assert [r.status_code for r in responses] == [200, 200]
@@ -0,0 +1,143 @@
+"""admission control utility functions"""
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from typing import AsyncIterator, Callable, TypeVar
+from fastapi import HTTPException
+from app.logger.custom_logger import log
+
+INTERACTIVE = "extract"
+INGESTION = "ocr"
+# lower value is admitted first when both classes are waiting
+PRIORITY = {INTERACTIVE: 0, INGESTION: 1}
+DEFAULT_MAX_CONCURRENCY = {INTERACTIVE: 8, INGESTION: 1}
+DEFAULT_MAX_QUEUE = {INTERACTIVE: 32, INGESTION: 2}
+DEFAULT_MAX_WAIT_SECONDS = {INTERACTIVE: 10, INGESTION: 60}
+DEFAULT_RETRY_AFTER_SECONDS = 5
+T = TypeVar("T")
+
+@dataclass
+class AdmissionPool:
+    """
+    concurrency, queue and worker threads of one endpoint class
+    """
+    priority: int
+    max_concurrency: int
+    max_queue: int
+    max_wait: float
+    executor: ThreadPoolExecutor
+    active: int = 0
+    queue: deque = field(default_factory=deque)
+
+class AdmissionController:
+    """
+    Separate concurrency pools, FIFO queues and worker threads per endpoint class.
+    Interactive queries are admitted before ingestion whenever both are waiting,
+    and requests are shed with 429/503 and Retry-After once a pool is saturated.
+    """
+    def __init__(self) -> None:
+        self._pools: dict[str, AdmissionPool] = {}
+        self._retry_after: int | None = None
+
+    @asynccontextmanager
+    async def admit(self, name: str) -> AsyncIterator[float]:
+        """
+        hold a slot in the pool of the given endpoint class, yield queue wait in seconds
+        """
+        pool = self.pool(name)
+        start = time.monotonic()
+        # newcomers never pass requests that are already queued
+        if not pool.queue and self._can_run(pool):
+            pool.active += 1
+        else:
+            await self._wait(name, pool)
+        try:
+            yield time.monotonic() - start
+        finally:
+            self._release(pool)
+
+    async def run(self, name: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """run a blocking call in the worker threads of the given endpoint class"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool(name).executor, \
+                                          partial(func, *args, **kwargs))
+
+    def pool(self, name: str) -> AdmissionPool:
+        """return the pool of an endpoint class, created lazily so environment is loaded first"""
+        if name not in self._pools:
+            prefix = f"ADMISSION_{name.upper()}"
+            max_concurrency = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", \
+                                            str(DEFAULT_MAX_CONCURRENCY[name])))
+            self._pools[name] = AdmissionPool(
+                priority=PRIORITY[name],
+                max_concurrency=max_concurrency,
+                max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", str(DEFAULT_MAX_QUEUE[name]))),
+                max_wait=float(os.getenv(f"{prefix}_MAX_WAIT_SECONDS", \
+                                         str(DEFAULT_MAX_WAIT_SECONDS[name]))),
+                # one worker per admitted request, so blocking calls never queue behind the pool
+                executor=ThreadPoolExecutor(max_workers=max_concurrency, \
+                                            thread_name_prefix=f"admission-{name}")
+            )
+        return self._pools[name]
+
+    def shed(self, status_code: int, message: str) -> HTTPException:
+        """build the load-shedding error with Retry-After header"""
+        if self._retry_after is None:
+            self._retry_after = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", \
+                                              str(DEFAULT_RETRY_AFTER_SECONDS)))
+        return HTTPException(status_code=status_code, detail={"message": message}, \
+                             headers={"Retry-After": str(self._retry_after)})
+
+    async def _wait(self, name: str, pool: AdmissionPool) -> None:
+        """queue the request until a freed slot is handed over to it"""
+        if len(pool.queue) >= pool.max_queue:
+            log.warning(f"Admission queue full for /{name}, request rejected")
+            raise self.shed(429, "Too many queued requests")
+        waiter = asyncio.get_running_loop().create_future()
+        pool.queue.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=pool.max_wait)
+        except BaseException:
+            # request was cancelled while queued, give back a slot handed over meanwhile
+            self._abandon(pool, waiter)
+            raise
+        if not waiter.done():
+            self._abandon(pool, waiter)
+            log.warning(f"Admission wait timed out for /{name}, request rejected")
+            raise self.shed(503, "Service busy, request waited too long")
+
+    def _abandon(self, pool: AdmissionPool, waiter: asyncio.Future) -> None:
+        """drop a waiter from the queue, releasing its slot if it was already admitted"""
+        if waiter.done():
+            self._release(pool)
+            return
+        waiter.cancel()
+        pool.queue.remove(waiter)
+        # a lower priority class may be waiting on this queue to drain
+        self._dispatch()
+
+    def _release(self, pool: AdmissionPool) -> None:
+        """free a slot and hand it over to the next queued request"""
+        pool.active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """admit queued requests in priority order, then in arrival order"""
+        for pool in sorted(self._pools.values(), key=lambda p: p.priority):
+            while pool.queue and self._can_run(pool):
+                pool.active += 1
+                pool.queue.popleft().set_result(None)
+
+    def _can_run(self, pool: AdmissionPool) -> bool:
+        """pool has a free slot and no higher priority class is queued"""
+        if pool.active >= pool.max_concurrency:
+            return False
+        return not any(p.queue for p in self._pools.values() if p.priority < pool.priority)
+
+# export
+ADMISSION = AdmissionController()
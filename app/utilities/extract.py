@@ -4,65 +4,125 @@ import tiktoken
 from pinecone import Pinecone
 from pinecone import PineconeException
 from openai import OpenAI, OpenAIError
+from app.utilities.index import INDEX_REGISTRY
+from app.utilities.lexical import LEXICAL_INDEX
+from app.utilities.admission import ADMISSION, INTERACTIVE
 from app.logger.custom_logger import log
 
 ENCODER = tiktoken.get_encoding("cl100k_base")
 CUSTOM_SYSTEM_PROMPT = "You are a helpful assistant knowing both English and Japanese. \
                         You will be given some domain specific knowledge in Japanese, please answer questions with \
                         the contextual information in both Japanese and English"
+DEFAULT_LEXICAL_WEIGHT = 0.3
+DEFAULT_CONTEXT_MAX_TOKEN = 2048
 
-def query(pc: Pinecone, client: OpenAI, query_text: str, file_id: str) -> str | None:
+async def query(pc: Pinecone, client: OpenAI, query_text: str, file_id: str) -> str | None:
     """
     query vector database based on given query text
     """
+    index_name = os.getenv('PINECONE_INDEX_NAME')
     try:
-        index_name = os.getenv('PINECONE_INDEX_NAME')
-        namespace = os.getenv('PINECONE_NAMESPACE')
-        model_name = os.getenv('OPENAI_EMBEDDING_MODEL')
-        # encode query into tokens
-        model_max_input =  int(os.getenv('OPENAI_EMBEDDING_MAX_INPUT'))
-        token = ENCODER.encode(query_text)
-        if len(token) > model_max_input:
-            raise ValueError(f"Token size exceed the maximum value: {model_max_input}")
+        with INDEX_REGISTRY.invalidate_on_error(index_name):
+            namespace = os.getenv('PINECONE_NAMESPACE')
+            model_name = os.getenv('OPENAI_EMBEDDING_MODEL')
+            # encode query into tokens
+            model_max_input =  int(os.getenv('OPENAI_EMBEDDING_MAX_INPUT'))
+            token = ENCODER.encode(query_text)
+            if len(token) > model_max_input:
+                raise ValueError(f"Token size exceed the maximum value: {model_max_input}")
 
-        query_embed = client.embeddings.create(input=token, model=model_name).data[0].embedding
-        index = pc.Index(index_name)
-        res = index.query(namespace=namespace, vector=query_embed, \
-                               top_k=15, include_metadata=True)
+            # run blocking client calls in the worker threads of the interactive pool
+            embeddings = await ADMISSION.run(INTERACTIVE, client.embeddings.create, \
+                                             input=token, model=model_name)
+            index = await INDEX_REGISTRY.get_index(pc, index_name)
+            res = await ADMISSION.run(INTERACTIVE, index.query, namespace=namespace, \
+                                      vector=embeddings.data[0].embedding, \
+                                      top_k=15, include_metadata=True)
 
-        # find the match where start with the same file_id in the id field
-        matches = [m['metadata']['text'] for m in res['matches'] if m['id'].startswith(file_id)]
-        return create_prompt(matches, query_text)
+            # find the match where start with the same file_id in the id field
+            matches = [m for m in res['matches'] if m['id'].startswith(file_id)]
+            return build_prompt(matches, query_text)
     except (PineconeException, OpenAIError, ValueError) as e:
         log.error(e)
     return None
 
-def create_prompt(matches: list, query_text: str) -> str:
+def rerank(matches: list, query_text: str) -> list[str]:
     """
-    query vector database based on given query text
+    fuse vector similarity and lexical scores, return match texts from best to worst
     """
-    max_token_count = int(os.getenv('OPENAI_GPT_MODEL_MAX_TOKEN'))
+    if not matches:
+        return []
+    lexical_weight = float(os.getenv('LEXICAL_WEIGHT', str(DEFAULT_LEXICAL_WEIGHT)))
+    for m in matches:
+        # chunks ingested before a restart are indexed from their metadata
+        if m['id'] not in LEXICAL_INDEX:
+            LEXICAL_INDEX.add(m['id'], m['metadata']['text'])
+    # scale both score sets the same way so the weight means relative influence
+    vector_scores = normalize({m['id']: m['score'] for m in matches})
+    lexical_scores = normalize(LEXICAL_INDEX.score(query_text, [m['id'] for m in matches]))
+    fused = sorted(matches, key=lambda m: (1 - lexical_weight) * vector_scores[m['id']] \
+                   + lexical_weight * lexical_scores[m['id']], reverse=True)
+    return [m['metadata']['text'] for m in fused]
+
+def normalize(scores: dict[str, float]) -> dict[str, float]:
+    """A helper function to min-max scale scores into [0, 1] within the candidates"""
+    low = min(scores.values())
+    high = max(scores.values())
+    if high == low:
+        return {key: 0.0 for key in scores}
+    return {key: (value - low) / (high - low) for key, value in scores.items()}
+
+def build_prompt(matches: list, query_text: str) -> str:
+    """
+    create prompt with the best re-ranked matches within the context budget,
+    report prompt tokens against stuffing all matches in similarity order
+    """
+    context_budget = int(os.getenv('PROMPT_CONTEXT_MAX_TOKEN', str(DEFAULT_CONTEXT_MAX_TOKEN)))
+    # encode every chunk once, counts are shared by the budget and the report
+    texts = [m['metadata']['text'] for m in matches]
+    token_counts = {text: len(ENCODER.encode(text)) for text in texts}
+    prompt_start, prompt_end, frame_token_count = prompt_frame(query_text)
+    before = select_context(texts, frame_token_count, token_counts)
+    after = select_context(rerank(matches, query_text), frame_token_count, \
+                           token_counts, context_budget)
+    log.info(f"Prompt tokens: {frame_token_count + sum(token_counts[m] for m in before)} "
+             f"before re-ranking, {frame_token_count + sum(token_counts[m] for m in after)} "
+             "after re-ranking")
+    return prompt_start + ''.join(m + '\n' for m in after) + prompt_end
+
+def prompt_frame(query_text: str) -> tuple[str, str, int]:
+    """A helper function to return prompt start, prompt end and their token count"""
     prompt_start = "Answer the question based on the context below.\n\n"+ "Context:\n"
     prompt_end = f"\n\nQuestion: {query_text}\nAnswer:"
-    cur_token_count = max_token_count - (len(ENCODER.encode(prompt_start)) \
-                                          + len(ENCODER.encode(prompt_end)))
-    context = ''
+    return prompt_start, prompt_end, len(ENCODER.encode(prompt_start)) \
+                                     + len(ENCODER.encode(prompt_end))
+
+def select_context(matches: list[str], frame_token_count: int, token_counts: dict[str, int], \
+                   context_budget: int | None = None) -> list[str]:
+    """
+    keep the leading matches that fit into the model limit and context budget
+    """
+    max_token_count = int(os.getenv('OPENAI_GPT_MODEL_MAX_TOKEN'))
+    cur_token_count = max_token_count - frame_token_count
+    if context_budget is not None:
+        cur_token_count = min(cur_token_count, context_budget)
+    context = []
     for m in matches:
-        cur_token_count -= len(ENCODER.encode(m))
-        if cur_token_count > 0:
-            context += m + '\n'
+        cur_token_count -= token_counts[m]
+        if cur_token_count >= 0:
+            context.append(m)
         else:
             break
-    return prompt_start + context + prompt_end
+    return context
 
 
-def generate_response(client: OpenAI, prompt: str) -> str | None:
+async def generate_response(client: OpenAI, prompt: str) -> str | None:
     """
         Call LLM model to generate answer by a given prompt
     """
     try:
         model_name = os.getenv('OPENAI_GPT_MODEL')
-        completion = client.chat.completions.create(
+        completion = await ADMISSION.run(INTERACTIVE, client.chat.completions.create,
             model=model_name,
             messages=[
                 {"role": "system", \
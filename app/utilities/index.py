@@ -0,0 +1,100 @@
+"""vector index utility functions"""
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Iterator
+from pinecone import Pinecone
+from pinecone import Index
+from pinecone import ServerlessSpec
+from pinecone import PineconeException
+from app.logger.custom_logger import log
+
+DIMENSION = 1536 # dimensionality of text-embed-3-small
+METRIC = "cosine" # pinecone recommended metric for model text-embed-3-small
+SPEC = ServerlessSpec(cloud="aws", region="us-east-1")
+DEFAULT_REFRESH_SECONDS = 300
+DEFAULT_READY_TIMEOUT_SECONDS = 60
+
+class IndexRegistry:
+    """
+    Process-wide cache of vector index handles.
+    Existence and readiness are checked once per index,
+    then the handle is reused until the refresh interval passes or it is invalidated.
+    """
+    def __init__(self) -> None:
+        self._handles: dict[str, tuple[Index, float]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def get_index(self, pc: Pinecone, index_name: str | None, create: bool = False) -> Index:
+        """
+        return a ready index handle, creating the index first if create is True
+        """
+        handle = self._cached(index_name)
+        if handle is not None:
+            return handle
+        lock = self._locks.setdefault(index_name, asyncio.Lock())
+        async with lock:
+            # another request may have filled the cache while we were waiting
+            handle = self._cached(index_name)
+            if handle is not None:
+                return handle
+            await index_init(index_name, pc, create)
+            handle = pc.Index(index_name)
+            self._handles[index_name] = (handle, time.monotonic())
+            return handle
+
+    def invalidate(self, index_name: str | None = None) -> None:
+        """drop a cached handle, or all of them if index_name is None"""
+        if index_name is None:
+            self._handles.clear()
+        else:
+            self._handles.pop(index_name, None)
+
+    @contextmanager
+    def invalidate_on_error(self, index_name: str | None) -> Iterator[None]:
+        """drop the cached handle when a pinecone call fails, so the index is checked again"""
+        try:
+            yield
+        except PineconeException:
+            self.invalidate(index_name)
+            raise
+
+    def _cached(self, index_name: str | None) -> Index | None:
+        """return the cached handle if it is still within the refresh interval"""
+        entry = self._handles.get(index_name)
+        if entry is None:
+            return None
+        handle, checked_at = entry
+        refresh_seconds = float(os.getenv('PINECONE_INDEX_REFRESH_SECONDS', \
+                                          str(DEFAULT_REFRESH_SECONDS)))
+        if time.monotonic() - checked_at > refresh_seconds:
+            self._handles.pop(index_name, None)
+            return None
+        return handle
+
+async def index_init(index_name: str | None, pc: Pinecone, create: bool = True) -> None:
+    """create a index if index_name is not found, then wait until it is ready"""
+    if index_name not in (await asyncio.to_thread(pc.list_indexes)).names():
+        if not create:
+            raise ValueError(f"Index {index_name} does not exist")
+        await asyncio.to_thread(pc.create_index,
+            name=index_name,
+            dimension=DIMENSION,
+            metric=METRIC,
+            spec=SPEC
+        )
+        # add logger info for first time index creation
+        log.info(f"New Index : {index_name} was created for pinecone")
+    ready_timeout = float(os.getenv('PINECONE_INDEX_READY_TIMEOUT_SECONDS', \
+                                    str(DEFAULT_READY_TIMEOUT_SECONDS)))
+    deadline = time.monotonic() + ready_timeout
+    # wait for index to be initialized without blocking the event loop
+    while not (await asyncio.to_thread(pc.describe_index, index_name)).status['ready']:
+        # queries fail fast, only a request that may create the index waits for it
+        if not create or time.monotonic() >= deadline:
+            raise ValueError(f"Index {index_name} is not ready")
+        await asyncio.sleep(1)
+
+# export
+INDEX_REGISTRY = IndexRegistry()
@@ -0,0 +1,83 @@
+"""lexical index utility functions"""
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+NGRAM_SIZE = 2 # character bigrams work well for Japanese text without word boundaries
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+class LexicalIndex:
+    """
+    In-memory inverted index of character n-grams over ingested chunk text.
+    Scores candidate chunks against a query with BM25.
+    """
+    def __init__(self, ngram_size: int = NGRAM_SIZE) -> None:
+        self.ngram_size = ngram_size
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._lengths: dict[str, int] = {}
+        self._grams: dict[str, list[str]] = {}
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._lengths
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, chunk_id: str, text: str) -> None:
+        """index chunk text, replacing any previous text of the same chunk"""
+        self.publish([(chunk_id, self.count(text))])
+
+    def count(self, text: str) -> Counter:
+        """count n-grams of chunk text, does not touch the index so it can run in a worker thread"""
+        return Counter(char_ngrams(text, self.ngram_size))
+
+    def publish(self, chunk_grams: list[tuple[str, Counter]]) -> None:
+        """merge counted chunks into the index, replacing previous text of the same chunks"""
+        for chunk_id, grams in chunk_grams:
+            if chunk_id in self:
+                self.remove(chunk_id)
+            for gram, count in grams.items():
+                self._postings[gram][chunk_id] = count
+            self._lengths[chunk_id] = sum(grams.values())
+            self._grams[chunk_id] = list(grams)
+
+    def remove(self, chunk_id: str) -> None:
+        """drop a chunk from the index"""
+        self._lengths.pop(chunk_id, None)
+        for gram in self._grams.pop(chunk_id, []):
+            postings = self._postings[gram]
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self._postings[gram]
+
+    def score(self, query_text: str, chunk_ids: list[str]) -> dict[str, float]:
+        """BM25 score of each given chunk for the query text"""
+        scores = {chunk_id: 0.0 for chunk_id in chunk_ids}
+        if not self._lengths:
+            return scores
+        total = len(self._lengths)
+        avg_length = sum(self._lengths.values()) / total
+        for gram in set(char_ngrams(query_text, self.ngram_size)):
+            postings = self._postings.get(gram)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id in chunk_ids:
+                freq = postings.get(chunk_id, 0)
+                if not freq:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        return scores
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> list[str]:
+    """A helper function to split normalized text into character n-grams"""
+    # NFKC folds full-width digits and letters, OCR line breaks are not meaningful
+    text = ''.join(unicodedata.normalize('NFKC', text).lower().split())
+    if len(text) < n:
+        return [text] if text else []
+    return [text[i: i+n] for i in range(len(text) - n + 1)]
+
+# export
+LEXICAL_INDEX = LexicalIndex()